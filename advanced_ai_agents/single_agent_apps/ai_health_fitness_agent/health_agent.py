@@ -1,6 +1,84 @@
+import asyncio
+import atexit
+import hashlib
+import logging
+import os
+import queue
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+
 import streamlit as st
 from agno.agent import Agent
-from agno.models.google import Gemini
+from agno.exceptions import ModelProviderError
+
+DB_PATH = Path(__file__).parent / "health_agent.db"
+LOG_FILE = Path(__file__).parent / "app.log"
+STYLE_PATH = Path(__file__).parent / "static" / "style.css"
+CACHE_TTL_SECONDS = 24 * 60 * 60
+CACHE_MAX_ENTRIES = 1000
+FAST_MODEL_ID = "gemini-2.0-flash"
+QUALITY_MODEL_ID = "gemini-2.5-flash-preview-05-20"
+MAX_OUTPUT_TOKENS = 900
+REQUEST_TIMEOUT_MS = 60_000
+MAX_RETRIES = 2
+RETRY_BASE_DELAY = 1.0
+DIETARY_INSTRUCTIONS = [
+    "Suggest a one-day meal plan that fits the user's preferences and goals.",
+    "Reply in Markdown with exactly these three sections, in this order, each under its own '## ' heading line:",
+    "'## Meal Plan', followed by breakfast, lunch, dinner and snacks, one short line each.",
+    "'## Why This Plan Works', followed by one sentence, under 40 words.",
+    "'## Important Considerations', followed by at most 4 short bullet points.",
+    "Keep the whole reply under 350 words.",
+]
+FITNESS_INSTRUCTIONS = [
+    "Suggest an actionable workout tailored to the user's goals.",
+    "Reply in Markdown with exactly these three sections, in this order, each under its own '## ' heading line:",
+    "'## Goals', followed by one sentence, under 30 words.",
+    "'## Routine', followed by warm-up, main workout and cool-down, with each exercise's benefit in a few words.",
+    "'## Tips', followed by at most 4 short bullet points.",
+    "Keep the whole reply under 350 words.",
+]
+DIETARY_SECTIONS = {
+    "meal plan": "meal_plan",
+    "why this plan works": "why_this_plan_works",
+    "important considerations": "important_considerations",
+}
+FITNESS_SECTIONS = {
+    "goals": "goals",
+    "routine": "routine",
+    "tips": "tips",
+}
+SECTION_HEADING = re.compile(r"^##(?!#)\s*(.+?)\s*$", re.MULTILINE)
+BULLET_MARKER = re.compile(r"^[-*•]\s+")
+ACTIVITY_LEVELS = ("Sedentary", "Lightly Active", "Moderately Active", "Very Active", "Extremely Active")
+DIETARY_PREFERENCES = ("Vegetarian", "Keto", "Gluten Free", "Low Carb", "Dairy Free")
+SEX_OPTIONS = ("Male", "Female", "Other")
+FITNESS_GOALS = ("Lose Weight", "Gain Muscle", "Endurance", "Stay Fit", "Strength Training")
+USER_PROFILE_TEMPLATE = (
+    "Age: {age}\n"
+    "Weight: {weight}kg\n"
+    "Height: {height}cm\n"
+    "Sex: {sex}\n"
+    "Activity Level: {activity_level}\n"
+    "Dietary Preferences: {dietary_preferences}\n"
+    "Fitness Goals: {fitness_goals}"
+)
+QA_CONTEXT_CHARS = 1500
+QA_HISTORY_LIMIT = 20
+QA_HISTORY_RETENTION_SECONDS = 7 * 24 * 60 * 60
+QA_HISTORY_TURNS = 5
+QA_INSTRUCTIONS = [
+    "Answer the user's questions about their dietary and fitness plans, given in the additional context.",
+    "Keep answers short and specific to the plans.",
+]
+STREAM_RENDER_INTERVAL = 0.1
 
 st.set_page_config(
     page_title="AI Health & Fitness Planner",
@@ -9,34 +87,64 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-st.markdown("""
-    <style>
-    .main {
-        padding: 2rem;
-    }
-    .stButton>button {
-        width: 100%;
-        border-radius: 5px;
-        height: 3em;
-    }
-    .success-box {
-        padding: 1rem;
-        border-radius: 0.5rem;
-        background-color: #f0fff4;
-        border: 1px solid #9ae6b4;
-    }
-    .warning-box {
-        padding: 1rem;
-        border-radius: 0.5rem;
-        background-color: #fffaf0;
-        border: 1px solid #fbd38d;
-    }
-    div[data-testid="stExpander"] div[role="button"] p {
-        font-size: 1.1rem;
-        font-weight: 600;
-    }
-    </style>
-""", unsafe_allow_html=True)
+@st.cache_resource
+def get_logger():
+    logger = logging.getLogger("health_agent")
+    if logger.handlers:
+        return logger
+
+    log_queue = queue.Queue(-1)
+    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    file_handler = RotatingFileHandler(LOG_FILE, maxBytes=10_000_000, backupCount=3, encoding="utf-8")
+    file_handler.setFormatter(formatter)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+    listener = QueueListener(log_queue, file_handler, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    level_name = os.getenv("LOG_LEVEL", "INFO").upper()
+    level = logging.getLevelName(level_name)
+    logger.setLevel(level if isinstance(level, int) else logging.INFO)
+    logger.addHandler(QueueHandler(log_queue))
+    if not isinstance(level, int):
+        logger.warning("Unknown LOG_LEVEL %r, falling back to INFO", level_name)
+    return logger
+
+logger = get_logger()
+
+HERO_HTML = (
+    "<div class='hero-box'>"
+    "Get personalized dietary and fitness plans tailored to your goals and preferences. "
+    "Our AI-powered system considers your unique profile to create the perfect plan for you."
+    "</div>"
+)
+
+@st.cache_data
+def load_css():
+    return f"<style>{STYLE_PATH.read_text(encoding='utf-8')}</style>"
+
+st.markdown(load_css(), unsafe_allow_html=True)
+
+def to_bullet_list(text):
+    lines = (BULLET_MARKER.sub("", line.strip()) for line in text.splitlines())
+    return "\n".join(f"- {line}" for line in lines if line)
+
+def render_qa_history(qa_pairs):
+    return "\n\n---\n\n".join(f"**Q:** {question}\n\n**A:** {answer}" for question, answer in qa_pairs)
+
+def parse_plan(content, sections, main_key):
+    plan = {}
+    headings = list(SECTION_HEADING.finditer(content))
+    for heading, next_heading in zip(headings, headings[1:] + [None]):
+        name, _, rest = heading.group(1).partition(":")
+        key = sections.get(name.strip("* ").lower())
+        if key:
+            end = next_heading.start() if next_heading else len(content)
+            plan[key] = (rest.strip("* ") + "\n" + content[heading.end():end]).strip()
+    if not plan.get(main_key):
+        plan[main_key] = content
+    return plan
 
 def display_dietary_plan(plan_content):
     with st.expander("📋 Your Personalized Dietary Plan", expanded=True):
@@ -50,10 +158,9 @@ def display_dietary_plan(plan_content):
         
         with col2:
             st.markdown("### ⚠️ Important Considerations")
-            considerations = plan_content.get("important_considerations", "").split('\n')
-            for consideration in considerations:
-                if consideration.strip():
-                    st.warning(consideration)
+            considerations = to_bullet_list(plan_content.get("important_considerations", ""))
+            if considerations:
+                st.warning(considerations)
 
 def display_fitness_plan(plan_content):
     with st.expander("💪 Your Personalized Fitness Plan", expanded=True):
@@ -67,178 +174,351 @@ def display_fitness_plan(plan_content):
         
         with col2:
             st.markdown("### 💡 Pro Tips")
-            tips = plan_content.get("tips", "").split('\n')
-            for tip in tips:
-                if tip.strip():
-                    st.info(tip)
+            tips = to_bullet_list(plan_content.get("tips", ""))
+            if tips:
+                st.info(tips)
 
-def main():
-    if 'dietary_plan' not in st.session_state:
-        st.session_state.dietary_plan = {}
-        st.session_state.fitness_plan = {}
-        st.session_state.qa_pairs = []
-        st.session_state.plans_generated = False
+@st.cache_resource
+def get_db():
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    with conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, created_at REAL, content TEXT)")
+        conn.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created_at)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS qa_history "
+            "(session_id TEXT, created_at REAL, question TEXT, answer TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS qa_history_session ON qa_history (session_id, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS qa_history_created ON qa_history (created_at)")
+    return conn, threading.Lock()
 
-    st.title("🏋️‍♂️ AI Health & Fitness Planner")
-    st.markdown("""
-        <div style='background-color: #00008B; padding: 1rem; border-radius: 0.5rem; margin-bottom: 2rem;'>
-        Get personalized dietary and fitness plans tailored to your goals and preferences.
-        Our AI-powered system considers your unique profile to create the perfect plan for you.
-        </div>
-    """, unsafe_allow_html=True)
+@contextmanager
+def db_transaction():
+    conn, lock = get_db()
+    with lock, conn:
+        yield conn
 
-    with st.sidebar:
-        st.header("🔑 API Configuration")
-        gemini_api_key = st.text_input(
-            "Gemini API Key",
-            type="password",
-            help="Enter your Gemini API key to access the service"
+def make_cache_key(*parts):
+    return hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()
+
+def get_cached_response(key):
+    with db_transaction() as conn:
+        row = conn.execute(
+            "SELECT content FROM responses WHERE key = ? AND created_at > ?",
+            (key, time.time() - CACHE_TTL_SECONDS)
+        ).fetchone()
+    return row[0] if row else None
+
+def set_cached_response(key, content):
+    try:
+        with db_transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, created_at, content) VALUES (?, ?, ?)",
+                (key, time.time(), content)
+            )
+            conn.execute("DELETE FROM responses WHERE created_at <= ?", (time.time() - CACHE_TTL_SECONDS,))
+            conn.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY created_at DESC LIMIT ?)",
+                (CACHE_MAX_ENTRIES,)
+            )
+    except sqlite3.Error:
+        logger.exception("Error caching response")
+
+def add_qa_pair(session_id, question, answer):
+    with db_transaction() as conn:
+        conn.execute(
+            "INSERT INTO qa_history (session_id, created_at, question, answer) VALUES (?, ?, ?, ?)",
+            (session_id, time.time(), question, answer)
+        )
+        conn.execute("DELETE FROM qa_history WHERE created_at <= ?", (time.time() - QA_HISTORY_RETENTION_SECONDS,))
+        conn.execute(
+            "DELETE FROM qa_history WHERE session_id = ? AND rowid NOT IN "
+            "(SELECT rowid FROM qa_history WHERE session_id = ? ORDER BY created_at DESC LIMIT ?)",
+            (session_id, session_id, QA_HISTORY_LIMIT)
         )
-        
-        if not gemini_api_key:
-            st.warning("⚠️ Please enter your Gemini API Key to proceed")
-            st.markdown("[Get your API key here](https://aistudio.google.com/apikey)")
-            return
-        
-        st.success("API Key accepted!")
 
-    if gemini_api_key:
+def get_qa_pairs(session_id, limit=QA_HISTORY_LIMIT):
+    with db_transaction() as conn:
+        rows = conn.execute(
+            "SELECT question, answer FROM qa_history WHERE session_id = ? ORDER BY created_at DESC LIMIT ?",
+            (session_id, limit)
+        ).fetchall()
+    return tuple(reversed(rows))
+
+def get_model(model_id, api_key):
+    if st.session_state.get("model_key") != (model_id, api_key):
+        from agno.models.google import Gemini
+
+        # Thinking tokens count towards max_output_tokens on 2.5 models, and these plans don't need them
+        st.session_state.model = Gemini(
+            id=model_id,
+            api_key=api_key,
+            max_output_tokens=MAX_OUTPUT_TOKENS,
+            thinking_budget=0 if model_id.startswith("gemini-2.5") else None,
+            client_params={"http_options": {"timeout": REQUEST_TIMEOUT_MS}}
+        )
+        st.session_state.model_key = (model_id, api_key)
+    return st.session_state.model
+
+def run_async(model, coroutine):
+    # asyncio.run closes its loop afterwards, taking the client's pooled connections with it,
+    # so drop the client and let agno create a fresh one inside the new loop
+    model.client = None
+    return asyncio.run(coroutine)
+
+def get_agents(model):
+    if st.session_state.get("agents_model") is not model:
+        dietary_agent = Agent(
+            name="Dietary Expert",
+            role="Provides personalized dietary recommendations",
+            model=model,
+            instructions=DIETARY_INSTRUCTIONS
+        )
+
+        fitness_agent = Agent(
+            name="Fitness Expert",
+            role="Provides personalized fitness recommendations",
+            model=model,
+            instructions=FITNESS_INSTRUCTIONS
+        )
+
+        qa_agent = Agent(model=model, instructions=QA_INSTRUCTIONS, show_tool_calls=True, markdown=True)
+
+        st.session_state.agents = (dietary_agent, fitness_agent, qa_agent)
+        st.session_state.agents_model = model
+    return st.session_state.agents
+
+def is_transient(error):
+    # agno reports every unclassified failure as a 502, so judge by the underlying
+    # exception instead: timeouts, connection errors, rate limits and server errors
+    import httpx
+    from google.genai.errors import ClientError, ServerError
+
+    cause = error.__cause__
+    if isinstance(cause, (httpx.TransportError, TimeoutError, ConnectionError, ServerError)):
+        return True
+    return isinstance(cause, ClientError) and cause.code == 429
+
+async def stream_response(agent, message, placeholder, cache_key, messages=None):
+    cached = get_cached_response(cache_key)
+    if cached is not None:
+        return cached
+
+    for attempt in range(MAX_RETRIES + 1):
+        content = ""
+        last_render = 0.0
         try:
-            gemini_model = Gemini(id="gemini-2.5-flash-preview-05-20", api_key=gemini_api_key)
-        except Exception as e:
-            st.error(f"❌ Error initializing Gemini model: {e}")
-            return
+            async for chunk in await agent.arun(message, messages=messages, stream=True):
+                content += chunk.content or ""
+                now = time.monotonic()
+                if now - last_render >= STREAM_RENDER_INTERVAL:
+                    placeholder.markdown(content)
+                    last_render = now
+            break
+        except ModelProviderError as e:
+            if content or not is_transient(e) or attempt == MAX_RETRIES:
+                raise
+            delay = RETRY_BASE_DELAY * 2 ** attempt
+            logger.warning("Retrying in %.1fs after provider error: %s", delay, e)
+            await asyncio.sleep(delay + random.uniform(0, delay))
+    placeholder.markdown(content)
+    if content:
+        set_cached_response(cache_key, content)
+    return content
 
-        st.header("👤 Your Profile")
-        
+async def generate_plans(dietary_agent, fitness_agent, user_profile, dietary_placeholder, fitness_placeholder):
+    model_id = dietary_agent.model.id
+    return await asyncio.gather(
+        stream_response(
+            dietary_agent, user_profile, dietary_placeholder,
+            make_cache_key(model_id, DIETARY_INSTRUCTIONS, user_profile, "diet")
+        ),
+        stream_response(
+            fitness_agent, user_profile, fitness_placeholder,
+            make_cache_key(model_id, FITNESS_INSTRUCTIONS, user_profile, "fitness")
+        ),
+    )
+
+@st.fragment
+def plan_fragment(gemini_model, dietary_agent, fitness_agent, qa_agent):
+    st.header("👤 Your Profile")
+    
+    with st.form("profile_form"):
         col1, col2 = st.columns(2)
-        
+    
         with col1:
-            age = st.number_input("Age", min_value=10, max_value=100, step=1, help="Enter your age")
-            height = st.number_input("Height (cm)", min_value=100.0, max_value=250.0, step=0.1)
+            age = st.number_input("Age", min_value=10, max_value=100, value=None, step=1, help="Enter your age")
+            height = st.number_input("Height (cm)", min_value=100.0, max_value=250.0, value=None, step=1.0, format="%.0f")
             activity_level = st.selectbox(
                 "Activity Level",
-                options=["Sedentary", "Lightly Active", "Moderately Active", "Very Active", "Extremely Active"],
+                options=ACTIVITY_LEVELS,
                 help="Choose your typical activity level"
             )
             dietary_preferences = st.selectbox(
                 "Dietary Preferences",
-                options=["Vegetarian", "Keto", "Gluten Free", "Low Carb", "Dairy Free"],
+                options=DIETARY_PREFERENCES,
                 help="Select your dietary preference"
             )
 
         with col2:
-            weight = st.number_input("Weight (kg)", min_value=20.0, max_value=300.0, step=0.1)
-            sex = st.selectbox("Sex", options=["Male", "Female", "Other"])
+            weight = st.number_input("Weight (kg)", min_value=20.0, max_value=300.0, value=None, step=1.0, format="%.0f")
+            sex = st.selectbox("Sex", options=SEX_OPTIONS)
             fitness_goals = st.selectbox(
                 "Fitness Goals",
-                options=["Lose Weight", "Gain Muscle", "Endurance", "Stay Fit", "Strength Training"],
+                options=FITNESS_GOALS,
                 help="What do you want to achieve?"
             )
 
-        if st.button("🎯 Generate My Personalized Plan", use_container_width=True):
+        submitted = st.form_submit_button("🎯 Generate My Personalized Plan", use_container_width=True)
+
+    if submitted and None in (age, weight, height):
+        st.warning("⚠️ Please fill in your age, weight and height before generating a plan")
+    elif submitted:
+        user_profile = USER_PROFILE_TEMPLATE.format(
+            age=age,
+            weight=round(weight),
+            height=round(height),
+            sex=sex,
+            activity_level=activity_level,
+            dietary_preferences=dietary_preferences,
+            fitness_goals=fitness_goals
+        )
+
+        if st.session_state.plans_generated and st.session_state.get("last_profile") == (gemini_model.id, user_profile):
+            display_dietary_plan(st.session_state.dietary_plan)
+            display_fitness_plan(st.session_state.fitness_plan)
+        else:
             with st.spinner("Creating your perfect health and fitness routine..."):
                 try:
-                    dietary_agent = Agent(
-                        name="Dietary Expert",
-                        role="Provides personalized dietary recommendations",
-                        model=gemini_model,
-                        instructions=[
-                            "Consider the user's input, including dietary restrictions and preferences.",
-                            "Suggest a detailed meal plan for the day, including breakfast, lunch, dinner, and snacks.",
-                            "Provide a brief explanation of why the plan is suited to the user's goals.",
-                            "Focus on clarity, coherence, and quality of the recommendations.",
-                        ]
-                    )
+                    logger.info("Generating plans with %s", gemini_model.id)
+                    logger.debug("User profile:\n%s", user_profile)
+
+                    preview_col1, preview_col2 = st.columns(2)
+                    dietary_placeholder = preview_col1.empty()
+                    fitness_placeholder = preview_col2.empty()
 
-                    fitness_agent = Agent(
-                        name="Fitness Expert",
-                        role="Provides personalized fitness recommendations",
-                        model=gemini_model,
-                        instructions=[
-                            "Provide exercises tailored to the user's goals.",
-                            "Include warm-up, main workout, and cool-down exercises.",
-                            "Explain the benefits of each recommended exercise.",
-                            "Ensure the plan is actionable and detailed.",
-                        ]
+                    dietary_content, fitness_content = run_async(
+                        gemini_model,
+                        generate_plans(
+                            dietary_agent, fitness_agent, user_profile,
+                            dietary_placeholder, fitness_placeholder
+                        )
                     )
+                    dietary_placeholder.empty()
+                    fitness_placeholder.empty()
 
-                    user_profile = f"""
-                    Age: {age}
-                    Weight: {weight}kg
-                    Height: {height}cm
-                    Sex: {sex}
-                    Activity Level: {activity_level}
-                    Dietary Preferences: {dietary_preferences}
-                    Fitness Goals: {fitness_goals}
-                    """
-
-                    dietary_plan_response = dietary_agent.run(user_profile)
-                    dietary_plan = {
-                        "why_this_plan_works": "High Protein, Healthy Fats, Moderate Carbohydrates, and Caloric Balance",
-                        "meal_plan": dietary_plan_response.content,
-                        "important_considerations": """
-                        - Hydration: Drink plenty of water throughout the day
-                        - Electrolytes: Monitor sodium, potassium, and magnesium levels
-                        - Fiber: Ensure adequate intake through vegetables and fruits
-                        - Listen to your body: Adjust portion sizes as needed
-                        """
-                    }
-
-                    fitness_plan_response = fitness_agent.run(user_profile)
-                    fitness_plan = {
-                        "goals": "Build strength, improve endurance, and maintain overall fitness",
-                        "routine": fitness_plan_response.content,
-                        "tips": """
-                        - Track your progress regularly
-                        - Allow proper rest between workouts
-                        - Focus on proper form
-                        - Stay consistent with your routine
-                        """
-                    }
+                    dietary_plan = parse_plan(dietary_content, DIETARY_SECTIONS, "meal_plan")
+                    fitness_plan = parse_plan(fitness_content, FITNESS_SECTIONS, "routine")
 
                     st.session_state.dietary_plan = dietary_plan
                     st.session_state.fitness_plan = fitness_plan
                     st.session_state.plans_generated = True
-                    st.session_state.qa_pairs = []
+                    st.session_state.last_profile = (gemini_model.id, user_profile)
+                    st.session_state.qa_session_id = uuid.uuid4().hex
 
                     display_dietary_plan(dietary_plan)
                     display_fitness_plan(fitness_plan)
 
                 except Exception as e:
+                    logger.exception("Error generating plans")
                     st.error(f"❌ An error occurred: {e}")
 
-        if st.session_state.plans_generated:
-            st.header("❓ Questions about your plan?")
-            question_input = st.text_input("What would you like to know?")
-
-            if st.button("Get Answer"):
-                if question_input:
-                    with st.spinner("Finding the best answer for you..."):
-                        dietary_plan = st.session_state.dietary_plan
-                        fitness_plan = st.session_state.fitness_plan
-
-                        context = f"Dietary Plan: {dietary_plan.get('meal_plan', '')}\n\nFitness Plan: {fitness_plan.get('routine', '')}"
-                        full_context = f"{context}\nUser Question: {question_input}"
-
-                        try:
-                            agent = Agent(model=gemini_model, show_tool_calls=True, markdown=True)
-                            run_response = agent.run(full_context)
-
-                            if hasattr(run_response, 'content'):
-                                answer = run_response.content
-                            else:
-                                answer = "Sorry, I couldn't generate a response at this time."
-
-                            st.session_state.qa_pairs.append((question_input, answer))
-                        except Exception as e:
-                            st.error(f"❌ An error occurred while getting the answer: {e}")
-
-            if st.session_state.qa_pairs:
-                st.header("💬 Q&A History")
-                for question, answer in st.session_state.qa_pairs:
-                    st.markdown(f"**Q:** {question}")
-                    st.markdown(f"**A:** {answer}")
+    if st.session_state.plans_generated:
+        st.header("❓ Questions about your plan?")
+        question_input = st.text_input("What would you like to know?")
+
+        if st.button("Get Answer"):
+            if question_input:
+                with st.spinner("Finding the best answer for you..."):
+                    dietary_plan = st.session_state.dietary_plan
+                    fitness_plan = st.session_state.fitness_plan
+
+                    context = (
+                        f"Dietary Plan: {dietary_plan.get('meal_plan', '')[:QA_CONTEXT_CHARS]}\n\n"
+                        f"Fitness Plan: {fitness_plan.get('routine', '')[:QA_CONTEXT_CHARS]}"
+                    )
+                    qa_agent.additional_context = context
+                    history = get_qa_pairs(st.session_state.qa_session_id, limit=QA_HISTORY_TURNS)
+                    history_messages = [
+                        message
+                        for question, answer in history
+                        for message in (
+                            {"role": "user", "content": question},
+                            {"role": "assistant", "content": answer},
+                        )
+                    ]
+
+                    try:
+                        answer_placeholder = st.empty()
+                        answer = run_async(
+                            gemini_model,
+                            stream_response(
+                                qa_agent, question_input, answer_placeholder,
+                                make_cache_key(gemini_model.id, context, history, question_input, "qa"),
+                                messages=history_messages
+                            )
+                        )
+                        answer_placeholder.empty()
+
+                        if not answer:
+                            answer = "Sorry, I couldn't generate a response at this time."
+
+                        add_qa_pair(st.session_state.qa_session_id, question_input, answer)
+                    except Exception as e:
+                        logger.exception("Error answering question")
+                        st.error(f"❌ An error occurred while getting the answer: {e}")
+
+        qa_pairs = get_qa_pairs(st.session_state.qa_session_id)
+        if qa_pairs:
+            st.header("💬 Q&A History")
+            *earlier_pairs, latest_pair = qa_pairs
+            st.markdown(render_qa_history((latest_pair,)))
+            if earlier_pairs:
+                with st.expander(f"Earlier questions ({len(earlier_pairs)})", expanded=False):
+                    st.markdown(render_qa_history(earlier_pairs))
+
+def main():
+    if 'dietary_plan' not in st.session_state:
+        st.session_state.dietary_plan = {}
+        st.session_state.fitness_plan = {}
+        st.session_state.qa_session_id = uuid.uuid4().hex
+        st.session_state.plans_generated = False
+
+    st.title("🏋️‍♂️ AI Health & Fitness Planner")
+    st.markdown(HERO_HTML, unsafe_allow_html=True)
+
+    with st.sidebar:
+        st.header("🔑 API Configuration")
+        gemini_api_key = st.text_input(
+            "Gemini API Key",
+            type="password",
+            help="Enter your Gemini API key to access the service"
+        ).strip()
+        
+        if not gemini_api_key:
+            st.warning("⚠️ Please enter your Gemini API Key to proceed")
+            st.markdown("[Get your API key here](https://aistudio.google.com/apikey)")
+            return
+        
+        st.success("API Key accepted!")
+
+        fast_mode = st.toggle(
+            "⚡ Fast mode",
+            value=True,
+            help="Use a smaller, faster model. Turn off for higher quality plans."
+        )
+
+    if gemini_api_key:
+        try:
+            gemini_model = get_model(FAST_MODEL_ID if fast_mode else QUALITY_MODEL_ID, gemini_api_key)
+            dietary_agent, fitness_agent, qa_agent = get_agents(gemini_model)
+        except Exception as e:
+            logger.exception("Error initializing Gemini model")
+            st.error(f"❌ Error initializing Gemini model: {e}")
+            return
+
+        plan_fragment(gemini_model, dietary_agent, fitness_agent, qa_agent)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file